@@ -1,64 +1,117 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import os
-import tempfile
 import subprocess
 import time
 from moviepy.editor import VideoFileClip, CompositeVideoClip, concatenate_videoclips
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from PIL import Image
 import numpy as np
 import cv2
 import shutil
-import random
+import threading
+import functools
+import hashlib
 from io import BytesIO  # ✅ Add this import at the top of your file
 
 st.set_page_config(page_title="🎨 AI Video Effects App", layout="centered")
 st.title("🎨 AI Video Effects App")
 
+# ---------- Frame Buffers ----------
+# Per-thread scratch arrays reused across frames so the filters below don't
+# allocate full-frame temporaries on every call.
+_scratch = threading.local()
+
+def _scratch_buffer(name, shape, dtype=np.uint8):
+    buf = getattr(_scratch, name, None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype=dtype)
+        setattr(_scratch, name, buf)
+    return buf
+
 # ---------- Style Filter Functions ----------
+# One generator for the warm grain and the rain overlay
+_rng = np.random.default_rng()
+
+_PASTEL_TINT_LUT = np.clip(
+    np.arange(256)[:, np.newaxis] + np.array([10, -5, 15]), 0, 255
+).astype(np.uint8)[np.newaxis]
+_WARM_TONE_LUT = np.clip(
+    np.arange(256)[:, np.newaxis] * np.array([1.15, 1.08, 0.95]) + np.array([15, 8, 0]), 0, 255
+).astype(np.uint8)[np.newaxis]
+
+# OpenCV's T-API runs these calls on the OpenCL device when one is present
+_USE_OPENCL = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+def pastel_style(frame):
+    if _USE_OPENCL:
+        src = cv2.UMat(frame)
+        blur = cv2.GaussianBlur(src, (7, 7), 0)
+        return cv2.LUT(cv2.addWeighted(src, 0.4, blur, 0.6, 0), _PASTEL_TINT_LUT).get()
+    blur = cv2.GaussianBlur(frame, (7, 7), 0, dst=_scratch_buffer("pastel_blur", frame.shape))
+    # 0.4 * frame + 0.6 * blur, then the per-channel tint as a saturating LUT
+    result = cv2.addWeighted(frame, 0.4, blur, 0.6, 0)
+    return cv2.LUT(result, _PASTEL_TINT_LUT, dst=result)
+
+@functools.lru_cache(maxsize=4)
+def _warm_vignette(rows, cols):
+    # Every frame of a video has the same size, so the mask is built once per size
+    Y, X = np.ogrid[:rows, :cols]
+    center = (rows / 2, cols / 2)
+    vignette = 1 - ((X - center[1])**2 + (Y - center[0])**2) / (1.5 * center[0] * center[1])
+    # Q7 fixed point: 255 * 128 still fits in int16, half the bytes of float32
+    return np.rint(np.clip(vignette, 0.3, 1) * 128).astype(np.int16)[..., np.newaxis]
+
+# Film grain comes from one precomputed tile, shifted by a random offset each
+# frame, instead of drawing a fresh Gaussian sample for every pixel.
+_GRAIN_TILE_SIZE = 512
+_GRAIN_TILE = np.rint(_rng.normal(0, 3, (_GRAIN_TILE_SIZE, _GRAIN_TILE_SIZE, 3))).astype(np.int16)
+
+def _add_grain(image):
+    shift = tuple(_rng.integers(0, _GRAIN_TILE_SIZE, 2))
+    tile = np.roll(_GRAIN_TILE, shift, axis=(0, 1))
+    rows, cols = image.shape[:2]
+    for y in range(0, rows, _GRAIN_TILE_SIZE):
+        for x in range(0, cols, _GRAIN_TILE_SIZE):
+            block = image[y:y + _GRAIN_TILE_SIZE, x:x + _GRAIN_TILE_SIZE]
+            block += tile[:block.shape[0], :block.shape[1]]
+
+def warm_style(frame):
+    toned = cv2.LUT(frame, _WARM_TONE_LUT, dst=_scratch_buffer("warm_lut", frame.shape))
+    vignette = _warm_vignette(*frame.shape[:2])
+    result = np.multiply(toned, vignette, out=_scratch_buffer("warm_i16", frame.shape, np.int16))
+    result >>= 7
+    _add_grain(result)
+    return np.clip(result, 0, 255, out=result).astype(np.uint8)
+
+def _identity(frame):
+    return frame
+
+_TRANSFORMS = {
+    "🌸 Soft Pastel Anime-Like Style": pastel_style,
+    "🎞️ Cinematic Warm Filter": warm_style,
+}
+
 def get_transform_function(style_name):
-    if style_name == "🌸 Soft Pastel Anime-Like Style":
-        def pastel_style(frame):
-            r, g, b = frame[:, :, 0], frame[:, :, 1], frame[:, :, 2]
-            r = np.clip(r * 1.08 + 20, 0, 255)
-            g = np.clip(g * 1.06 + 15, 0, 255)
-            b = np.clip(b * 1.15 + 25, 0, 255)
-            blurred = (frame.astype(np.float32) * 0.4 +
-                       cv2.GaussianBlur(frame, (7, 7), 0).astype(np.float32) * 0.6)
-            tint = np.array([10, -5, 15], dtype=np.float32)
-            result = np.clip(blurred + tint, 0, 255).astype(np.uint8)
-            return result
-        return pastel_style
-
-    elif style_name == "🎮 Cinematic Warm Filter":
-        def warm_style(frame):
-            r, g, b = frame[:, :, 0], frame[:, :, 1], frame[:, :, 2]
-            r = np.clip(r * 1.15 + 15, 0, 255)
-            g = np.clip(g * 1.08 + 8, 0, 255)
-            b = np.clip(b * 0.95, 0, 255)
-            rows, cols = r.shape
-            Y, X = np.ogrid[:rows, :cols]
-            center = (rows / 2, cols / 2)
-            vignette = 1 - ((X - center[1])**2 + (Y - center[0])**2) / (1.5 * center[0] * center[1])
-            vignette = np.clip(vignette, 0.3, 1)[..., np.newaxis]
-            result = np.stack([r, g, b], axis=2).astype(np.float32) * vignette
-            grain = np.random.normal(0, 3, frame.shape).astype(np.float32)
-            return np.clip(result + grain, 0, 255).astype(np.uint8)
-        return warm_style
-
-    return lambda frame: frame
+    return _TRANSFORMS.get(style_name, _identity)
 
 # ---------- Rain Overlay ----------
+
 def add_rain_effect(frame, density=0.002):
     frame = frame.copy()
     h, w, _ = frame.shape
     num_drops = int(h * w * density)
-    for _ in range(num_drops):
-        x = random.randint(0, w - 1)
-        y = random.randint(0, h - 20)
-        length = random.randint(10, 20)
-        thickness = 1
-        color = (200, 200, 255)
-        cv2.line(frame, (x, y), (x, y + length), color, thickness)
+    # Each drop is a 1px vertical streak spanning length + 1 rows (like cv2.line);
+    # all streak pixels are built at once and painted in a single assignment.
+    xs = _rng.integers(0, w, num_drops)
+    ys = _rng.integers(0, h - 19, num_drops)
+    lengths = _rng.integers(10, 21, num_drops)
+    offsets = np.arange(21)
+    rows = ys[:, np.newaxis] + offsets
+    mask = (offsets <= lengths[:, np.newaxis]) & (rows < h)
+    cols = np.broadcast_to(xs[:, np.newaxis], rows.shape)
+    frame[rows[mask], cols[mask]] = (200, 200, 255)
     return frame
 
 def get_rain_function(option):
@@ -71,26 +124,204 @@ def get_rain_function(option):
     else:
         return lambda f: f
 
+# ---------- Encoder ----------
+# Hardware H.264 encoders in order of preference, with settings roughly
+# matching libx264 at -crf 22.
+_HW_H264_ENCODERS = [
+    # -b:v 0 lifts NVENC's default 2M bitrate cap so -cq alone sets the quality
+    ("h264_nvenc", ["-preset", "p4", "-rc", "vbr", "-cq", "22", "-b:v", "0"]),
+    ("h264_amf", ["-quality", "balanced", "-rc", "cqp", "-qp_i", "22", "-qp_p", "22"]),
+    ("h264_videotoolbox", ["-b:v", "6M"]),
+    ("h264_qsv", ["-global_quality", "22"]),
+]
+
+@st.cache_resource(show_spinner=False)
+def get_h264_encoder():
+    # An encoder can be compiled into ffmpeg without a usable device behind it,
+    # so each candidate is confirmed with a tiny test encode.
+    try:
+        available = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True
+        ).stdout
+    except OSError:
+        available = ""
+    for codec, params in _HW_H264_ENCODERS:
+        if codec not in available:
+            continue
+        probe = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=black:s=256x256:d=0.1",
+            "-c:v", codec, *params, "-pix_fmt", "yuv420p", "-f", "null", "-"
+        ]
+        if subprocess.run(probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+            return codec, params
+    # A bounded thread count keeps a long encode from starving the Streamlit server
+    return "libx264", ["-preset", "veryfast", "-crf", "22", "-threads", "4"]
+
+@st.cache_resource(show_spinner=False)
+def get_hwaccel_args():
+    # NVDEC decode for inputs ffmpeg reads itself; frames come back to system
+    # memory, so the CPU filters and any encoder still apply. -init_hw_device
+    # fails without a usable CUDA device, unlike merely listing the hwaccel.
+    probe = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-init_hw_device", "cuda",
+        "-f", "lavfi", "-i", "color=black:s=256x256:d=0.1", "-f", "null", "-"
+    ]
+    try:
+        if subprocess.run(probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+            return ["-hwaccel", "cuda"]
+    except OSError:
+        pass
+    return []
+
+# ---------- FFmpeg Commands ----------
+_EVEN_SIZE_FILTER = "scale=ceil(iw/2)*2:ceil(ih/2)*2"
+
+# x264 tunings that suit each style's content; hardware encoders have no equivalent
+_X264_TUNES = {
+    "🌸 Soft Pastel Anime-Like Style": "animation",
+    "🎞️ Cinematic Warm Filter": "film",
+}
+
+def h264_encode_args(tune=None, x264_preset=None):
+    codec, params = get_h264_encoder()
+    if codec == "libx264":
+        if x264_preset:
+            params = list(params)
+            params[params.index("-preset") + 1] = x264_preset
+        if tune:
+            params = params + ["-tune", tune]
+    return ["-c:v", codec, *params, "-pix_fmt", "yuv420p"]
+
+def run_ffmpeg(cmd, error_message, frames=None):
+    # frames, when given, are piped to ffmpeg's stdin as raw video
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if frames is not None else subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        if frames is not None:
+            for frame in frames:
+                proc.stdin.write(frame.tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its stderr below says why
+    finally:
+        _, stderr = proc.communicate()
+    if proc.returncode:
+        st.error(error_message)
+        st.code(stderr.decode(), language="bash")
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+
+def styled_output_args(filter_chain, audio_input, encode_args, output_path, preview_path, preview_height=360):
+    # The full-size render and its preview come out of one ffmpeg process, so
+    # the styled file never has to be decoded again just to downscale it.
+    graph = (
+        f"[0:v]{filter_chain},split[full][small];"
+        f"[small]scale=-2:{preview_height}[preview]"
+    )
+    return [
+        "-filter_complex", graph,
+        "-map", "[full]", "-map", f"{audio_input}:a?", *encode_args, "-c:a", "copy", output_path,
+        "-map", "[preview]", "-map", f"{audio_input}:a?", *encode_args, "-c:a", "copy", preview_path,
+    ]
+
 # ---------- Watermark ----------
-def apply_watermark(input_path, output_path, text="@USMIKASHMIRI"):
-    watermark_filter = (
-        "scale=ceil(iw/2)*2:ceil(ih/2)*2," +
+def get_watermark_filter(text="@USMIKASHMIRI"):
+    return (
+        _EVEN_SIZE_FILTER + "," +
         f"drawtext=fontfile='/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf':" +
         f"text='{text}':x=w-mod(t*240\\,w+tw):y=h-160:"
         "fontsize=40:fontcolor=white@0.6:shadowcolor=black:shadowx=2:shadowy=2"
     )
+
+# ---------- FFmpeg Style Filters ----------
+# Filtergraph versions of the styles above. When no Python-only effect (rain)
+# is selected, the whole job runs inside one ffmpeg process. Pastel converts to
+# planar RGB first so the blur and blend see full-resolution colour like the
+# NumPy version (sigma 1.4 is what OpenCV picks for a 7x7 kernel); warm uses
+# ffmpeg's vignette and temporal noise in place of the hand-rolled ones.
+_FFMPEG_STYLE_FILTERS = {
+    "None": "null",
+    "🌸 Soft Pastel Anime-Like Style": (
+        "format=gbrp,split[src][tmp];[tmp]gblur=sigma=1.4[blur];"
+        "[src][blur]blend=all_mode=normal:all_opacity=0.4,"
+        "format=rgb24,lutrgb=r='val+10':g='val-5':b='val+15'"
+    ),
+    "🎞️ Cinematic Warm Filter": (
+        "format=rgb24,lutrgb=r='val*1.15+15':g='val*1.08+8':b='val*0.95',"
+        "vignette=angle=PI/4,noise=alls=6:allf=t"
+    ),
+}
+
+def get_ffmpeg_style_filter(style_name):
+    return _FFMPEG_STYLE_FILTERS.get(style_name)
+
+def render_styled_with_ffmpeg(input_path, output_path, preview_path, style_filter, video_filter=None, tune=None):
+    cmd = [
+        "ffmpeg", "-y", *get_hwaccel_args(), "-i", input_path,
+        *styled_output_args(
+            f"{style_filter},{video_filter or _EVEN_SIZE_FILTER}", 0,
+            h264_encode_args(tune), output_path, preview_path,
+        ),
+    ]
+    run_ffmpeg(cmd, "❌ FFmpeg styling failed.")
+
+# ---------- Frame Pipeline ----------
+def _usable_cpus():
+    # The CPUs this process may run on, which can be fewer than the host has
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def map_frames(frame_fn, frames, workers=None):
+    # OpenCV/NumPy release the GIL, so a thread pool filters frames in parallel.
+    # Only a bounded window of frames is in flight and results keep source order.
+    # Each worker holds its own scratch frames, so the pool is capped like x264's
+    # threads to keep memory bounded and leave CPU for the Streamlit server.
+    workers = workers or min(4, _usable_cpus())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for frame in frames:
+            pending.append(pool.submit(frame_fn, frame))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def write_styled_video(clip, frame_fn, output_path, preview_path, audio_path, video_filter=None, tune=None):
+    # The Python filters are the bottleneck on this path, so x264 can go faster still
+    encode_args = h264_encode_args(tune, x264_preset="ultrafast")
+    width, height = clip.size
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{clip.fps}", "-i", "-",
+        "-i", audio_path,
+        *styled_output_args(
+            video_filter or _EVEN_SIZE_FILTER, 1, encode_args, output_path, preview_path,
+        ),
+    ]
+    frames = map_frames(frame_fn, clip.iter_frames(dtype="uint8"))
+    run_ffmpeg(cmd, "❌ FFmpeg encoding failed.", frames=frames)
+
+# ---------- Previews ----------
+def render_preview(input_path, output_path, height=360):
     cmd = [
-        "ffmpeg", "-y", "-i", input_path,
-        "-vf", watermark_filter,
-        "-c:v", "libx264", "-preset", "fast", "-crf", "22", "-pix_fmt", "yuv420p",
+        "ffmpeg", "-y", *get_hwaccel_args(), "-i", input_path,
+        "-vf", f"scale=-2:{height}",
+        *h264_encode_args(), "-c:a", "copy",
         output_path
     ]
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except subprocess.CalledProcessError as e:
-        st.error("❌ FFmpeg watermarking failed.")
-        st.code(e.stderr.decode(), language="bash")
-        raise
+    run_ffmpeg(cmd, "❌ FFmpeg preview rendering failed.")
+
+def submit_with_script_ctx(pool, fn, *args):
+    # Attaching the script context lets st.error() from the worker still reach the page
+    ctx = get_script_run_ctx()
+
+    def job():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return pool.submit(job)
 
 # 🎯 Inject rain options INSIDE Feature 2 & 3 UI blocks (moved in the code below)
 # 🌧️ Add Rain to Feature 2 and 3
@@ -121,82 +352,112 @@ generate = st.button("🌸 Generate Styled Video")
 output_dir = "processed_videos"
 os.makedirs(output_dir, exist_ok=True)
 
-if uploaded_file and generate:
-    start_time = time.time()
-    with tempfile.TemporaryDirectory() as tmpdir:
-        input_path = os.path.join(tmpdir, "input.mp4")
-        with open(input_path, "wb") as f:
-            f.write(uploaded_file.read())
-
-        clip = VideoFileClip(input_path)
-        transform_fn = get_transform_function(style)
-
-        # Rain logic
-        if rain_option == "🌧️ Light Rain (Default)":
-            def combined_effect(frame):
-                return add_rain_effect(transform_fn(frame), density=0.002)
-            styled_clip = clip.fl_image(combined_effect)
-
-        elif rain_option == "🌦️ Extra Light Rain":
-            def combined_effect(frame):
-                return add_rain_effect(transform_fn(frame), density=0.0008)
-            styled_clip = clip.fl_image(combined_effect)
-
-        elif rain_option == "🌤️ Ultra Light Rain":
-            def combined_effect(frame):
-                return add_rain_effect(transform_fn(frame), density=0.0004)
-            styled_clip = clip.fl_image(combined_effect)
+_MAX_CACHED_RENDERS = 8
 
-        else:
-            styled_clip = clip.fl_image(transform_fn)
+def get_render_dir(video_digest, style, rain_option, add_watermark):
+    render_key = f"{video_digest}|{style}|{rain_option}|{add_watermark}"
+    return os.path.join(output_dir, hashlib.blake2b(render_key.encode(), digest_size=16).hexdigest())
+
+def _prune_render_dirs(keep):
+    # Oldest mtime first; cache hits touch their folder so this follows the cache's LRU order
+    render_dirs = [os.path.join(output_dir, name) for name in os.listdir(output_dir)]
+    render_dirs = sorted(filter(os.path.isdir, render_dirs), key=os.path.getmtime, reverse=True)
+    for render_dir in render_dirs[keep:]:
+        shutil.rmtree(render_dir, ignore_errors=True)
 
-        styled_temp = os.path.join(tmpdir, "styled.mp4")
-        styled_clip.write_videofile(styled_temp, codec="libx264", audio_codec="aac")
+def _render_into(render_dir, style, rain_option, add_watermark, uploaded_file):
+    _prune_render_dirs(keep=_MAX_CACHED_RENDERS - 1)
+    os.makedirs(render_dir, exist_ok=True)
 
-        if add_watermark:
-            watermarked_output = os.path.join(tmpdir, "styled_watermarked.mp4")
-            apply_watermark(styled_temp, watermarked_output)
-            styled_final_path = watermarked_output
+    # Everything is written straight into the persistent directory, so the
+    # upload and each rendered file are only written to disk once.
+    orig_final = os.path.join(render_dir, "original.mp4")
+    styled_final = os.path.join(render_dir, "styled.mp4")
+    preview_orig_final = os.path.join(render_dir, "original_preview.mp4")
+    preview_styled_final = os.path.join(render_dir, "styled_preview.mp4")
+
+    uploaded_file.seek(0)
+    with open(orig_final, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+
+    # The watermark is burned in by the same ffmpeg process that encodes the styled frames
+    watermark_filter = get_watermark_filter() if add_watermark else None
+    style_filter = get_ffmpeg_style_filter(style)
+    tune = _X264_TUNES.get(style)
+
+    # The original's preview only reads the upload, so its ffmpeg process runs
+    # alongside the styled render; the styled preview comes out of that encode itself.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        preview_job = submit_with_script_ctx(pool, render_preview, orig_final, preview_orig_final)
+
+        if rain_option == "None" and style_filter:
+            render_styled_with_ffmpeg(orig_final, styled_final, preview_styled_final, style_filter, video_filter=watermark_filter, tune=tune)
         else:
-            styled_final_path = styled_temp
-
-        # Generate previews (scaled to height 360)
-        preview_original_temp = os.path.join(tmpdir, "original_preview.mp4")
-        preview_styled_temp = os.path.join(tmpdir, "styled_preview.mp4")
-        clip.resize(height=360).write_videofile(preview_original_temp, codec="libx264", audio_codec="aac")
-        VideoFileClip(styled_final_path).resize(height=360).write_videofile(preview_styled_temp, codec="libx264", audio_codec="aac")
-
-        # Save files to persistent directory
-        orig_final = os.path.join(output_dir, "original.mp4")
-        styled_final = os.path.join(output_dir, "styled.mp4")
-        preview_orig_final = os.path.join(output_dir, "original_preview.mp4")
-        preview_styled_final = os.path.join(output_dir, "styled_preview.mp4")
-
-        shutil.copy(input_path, orig_final)
-        shutil.copy(styled_final_path, styled_final)
-        shutil.copy(preview_original_temp, preview_orig_final)
-        shutil.copy(preview_styled_temp, preview_styled_final)
-
-        # Save in session
-        st.session_state["styled_output_path"] = styled_final
-        st.session_state["original_path"] = orig_final
-        st.session_state["preview_original"] = preview_orig_final
-        st.session_state["preview_styled"] = preview_styled_final
-        st.session_state["process_time"] = time.time() - start_time
+            transform_fn = get_transform_function(style)
+            rain_fn = get_rain_function(rain_option)
+
+            def styled_frame(frame):
+                return rain_fn(transform_fn(frame))
+
+            # ffmpeg muxes the audio straight from the source, so MoviePy only needs frames
+            with VideoFileClip(orig_final, audio=False) as clip:
+                write_styled_video(clip, styled_frame, styled_final, preview_styled_final, orig_final, video_filter=watermark_filter, tune=tune)
+
+        preview_job.result()
+
+    return {
+        "styled_output_path": styled_final,
+        "original_path": orig_final,
+        "preview_original": preview_orig_final,
+        "preview_styled": preview_styled_final,
+    }
+
+@st.cache_data(show_spinner=False, max_entries=_MAX_CACHED_RENDERS)
+def render_styled_video(video_digest, style, rain_option, add_watermark, _uploaded_file):
+    # Cached on the upload's digest plus the chosen options. Streamlit doesn't
+    # hash underscore parameters, so the upload itself is only read on a miss.
+    return _render_into(get_render_dir(video_digest, style, rain_option, add_watermark),
+                        style, rain_option, add_watermark, _uploaded_file)
+
+if uploaded_file and generate:
+    start_time = time.time()
+    with uploaded_file.getbuffer() as upload_bytes:
+        video_digest = hashlib.blake2b(upload_bytes).hexdigest()
+    renders = render_styled_video(video_digest, style, rain_option, add_watermark, uploaded_file)
+    render_dir = get_render_dir(video_digest, style, rain_option, add_watermark)
+    if not all(os.path.exists(path) for path in renders.values()):
+        # The cached entry's folder was pruned since; its paths depend only on
+        # the key, so rendering into them again makes the entry valid again
+        renders = _render_into(render_dir, style, rain_option, add_watermark, uploaded_file)
+    os.utime(render_dir)
+
+    # Save in session
+    st.session_state.update(renders)
+    st.session_state["process_time"] = time.time() - start_time
+
+_RENDER_KEYS = ("styled_output_path", "original_path", "preview_original", "preview_styled")
 
 # Display result
+if "styled_output_path" in st.session_state and not all(
+    os.path.exists(st.session_state[key]) for key in _RENDER_KEYS
+):
+    # Another render pruned this session's folder to free space
+    for key in _RENDER_KEYS:
+        st.session_state.pop(key, None)
+    st.warning("⚠️ This render was cleared to free space. Please generate it again.")
+
 if "styled_output_path" in st.session_state:
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("🔹 Original")
         st.video(st.session_state["preview_original"])
         with open(st.session_state["original_path"], "rb") as f:
-            st.download_button("⬇️ Download Original", f.read(), file_name="original.mp4")
+            st.download_button("⬇️ Download Original", f, file_name="original.mp4", mime="video/mp4")
 
     with col2:
         st.subheader("🔸 Styled")
         st.video(st.session_state["preview_styled"])
         with open(st.session_state["styled_output_path"], "rb") as f:
-            st.download_button("⬇️ Download Styled", f.read(), file_name="styled.mp4")
+            st.download_button("⬇️ Download Styled", f, file_name="styled.mp4", mime="video/mp4")
 
     st.success(f"✅ Done in {st.session_state['process_time']:.2f} sec")